@@ -4,7 +4,7 @@ from common import *
 import Maze
 from Maze.constants import *
 
-from heapq import heappush, heappop
+from collections import defaultdict, deque
 
 def dfs_heuristic(r, c):
     return 0
@@ -12,21 +12,14 @@ def dfs_heuristic(r, c):
 def manhattan_heuristic(r, c):
     return abs(ROWS - 1 - r) + abs(COLS - 1 - c)
 
-def get_action_index(move):
-    if move in MAZE_MOVES:
-        action = MAZE_MOVES.index(move)
-        print 'Picking action', action, 'for move', move
-        return action
-    else:
-        return None
+# action index of each (dr, dc) move
+MAZE_MOVE_INDEX = dict((move, i) for i, move in enumerate(MAZE_MOVES))
 
-class Cell:
-    def __init__(self, h, r, c):
-        self.h = h
-        self.r = r
-        self.c = c
-    def __cmp__(self, other):
-        return cmp(self.h, other.h)
+# (sensor index, dr, dc) of each move - the sensor is non-zero if the move is blocked
+MAZE_SENSOR_MOVES = tuple((2 + i, dr, dc) for i, (dr, dc) in enumerate(MAZE_MOVES))
+
+def get_action_index(move):
+    return MAZE_MOVE_INDEX.get(move)
 
 class RandomAgent(AgentBrain):
     """
@@ -230,39 +223,27 @@ class SearchAgent(AgentBrain):
     def __init__(self):
         """ constructor """
         AgentBrain.__init__(self)
-        self.backpointers = {}
+        # cells are numbered r * COLS + c; for each cell, the number of its predecessor or -1
+        self.backpointers = [-1] * (ROWS * COLS)
         self.starting_pos = None
+        self.env = None # set at the start of each episode
 
     def highlight_path(self):
         """
         backtrack to highlight the path
         """
         # retrace the path
-        node = (ROWS - 1, COLS - 1)
-        #print "starting with node (%s, %s)" % node
-        while node in self.backpointers:
+        node = ROWS * COLS - 1
+        start = self.starting_pos[0] * COLS + self.starting_pos[1]
+        #print "starting with node (%s, %s)" % divmod(node, COLS)
+        while self.backpointers[node] >= 0:
             #print "Marked white."
-            self.mark_path(node[0], node[1])
-            next_node = self.backpointers[node]
-            #del self.backpointers[node]
-            node = next_node
-            #print "Moving to next node: (%s, %s)" % node
-            if node == self.starting_pos:
-                break
-
-    def get_distance(self, row, col):
-        """
-        get the distance to given cell from the source based on the backpointers
-        """
-        # retrace the path
-        hops = 0
-        node = (row, col)
-        while node in self.backpointers:
+            r, c = divmod(node, COLS)
+            self.mark_path(r, c)
             node = self.backpointers[node]
-            hops += 1
-            if node == self.starting_pos:
+            #print "Moving to next node: (%s, %s)" % divmod(node, COLS)
+            if node == start:
                 break
-        return hops
 
 class DFSSearchAgent(SearchAgent):
     """
@@ -276,60 +257,68 @@ class DFSSearchAgent(SearchAgent):
         SearchAgent.__init__(self)
         self.visited = set([])
         self.adjlist = {}
-        self.parents = {}
+        self.parents = [-1] * (ROWS * COLS) # numbered like the backpointers
 
     def dfs_action(self, observations):
-        r = observations[0]
-        c = observations[1]
+        r = int(observations[0])
+        c = int(observations[1])
         current_cell = (r, c)
+        current = r * COLS + c
         # if we have not been here before, build a list of other places we can go
         if current_cell not in self.visited:
             tovisit = []
-            for m, (dr, dc) in enumerate(MAZE_MOVES):
+            sense = observations.__getitem__
+            for m, dr, dc in MAZE_SENSOR_MOVES:
                 r2, c2 = r + dr, c + dc
-                if not observations[2 + m]: # can we go that way?
+                if not sense(m): # can we go that way?
                     if (r2, c2) not in self.visited:
                         tovisit.append((r2, c2))
-                        self.parents[(r2, c2)] = current_cell
-            # remember the cells that are adjacent to this one
-            self.adjlist[current_cell] = tovisit
+                        self.parents[r2 * COLS + c2] = current
+            # remember the cells that are adjacent to this one, and how far we have scanned them
+            self.adjlist[current_cell] = [tovisit, 0]
         # if we have been here before, check if we have other places to visit
-        adjlist = self.adjlist[current_cell]
-        k = 0
+        entry = self.adjlist[current_cell]
+        adjlist, k = entry
+        # cells never become unvisited, so we can resume the scan where we left off
         while k < len(adjlist) and adjlist[k] in self.visited:
             k += 1
+        entry[1] = k
         # if we don't have other neighbors to visit, back up
         if k == len(adjlist):
-            next_cell = self.parents[current_cell]
+            next_cell = divmod(self.parents[current], COLS)
         else: # otherwise visit the next place
             next_cell = adjlist[k]
         self.visited.add(current_cell) # add this location to visited list
         if current_cell != self.starting_pos:
-            get_environment().mark_maze_blue(r, c) # mark it as blue on the maze
-        v = self.constraints.get_instance() # make the action vector to return
+            self.env.mark_maze_blue(r, c) # mark it as blue on the maze
+        v = self.next_action # reuse the action vector we return
         dr, dc = next_cell[0] - r, next_cell[1] - c # the move we want to make
         v[0] = get_action_index((dr, dc))
         # remember how to get back
-        if next_cell not in self.backpointers:
-            self.backpointers[next_cell] = current_cell
+        next_node = next_cell[0] * COLS + next_cell[1]
+        if self.backpointers[next_node] < 0:
+            self.backpointers[next_node] = current
         return v
 
     def initialize(self, init_info):
         self.constraints = init_info.actions
+        self.next_action = self.constraints.get_instance() # action vector reused at every step
         return True
 
     def start(self, time, observations):
         # return action
-        r = observations[0]
-        c = observations[1]
+        r = int(observations[0])
+        c = int(observations[1])
         self.starting_pos = (r, c)
-        get_environment().mark_maze_white(r, c)
+        self.env = get_environment() # the environment we mark the maze in
+        self.env.mark_maze_white(r, c)
         return self.dfs_action(observations)
 
     def reset(self):
         self.visited = set([])
-        self.parents = {}
-        self.backpointers = {}
+        self.adjlist = {}
+        self.parents = [-1] * (ROWS * COLS)
+        self.backpointers = [-1] * (ROWS * COLS)
         self.starting_pos = None
 
     def act(self, time, observations, reward):
@@ -342,7 +331,7 @@ class DFSSearchAgent(SearchAgent):
         return True
 
     def mark_path(self, r, c):
-        get_environment().mark_maze_white(r,c)
+        self.env.mark_maze_white(r,c)
 
 class GenericSearchAlgorithm(SearchAgent):
     """
@@ -361,32 +350,48 @@ class GenericSearchAlgorithm(SearchAgent):
         Reset the agent
         """
         self.parents = {}
-        self.queue = [] # queue of cells to visit (front)
-        self.visited = set([]) # set of nodes we have visited
-        self.enqueued = set([]) # set of things in the queue (superset of visited)
-        self.backpointers = {} # a dictionary from nodes to their predecessors
+        self.reset_queue()
+        # the grid is small and bounded, so cell flags are kept in flat lists indexed by r * COLS + c
+        self.visited = [False] * (ROWS * COLS) # nodes we have visited
+        self.enqueued = [False] * (ROWS * COLS) # things in the queue (superset of visited)
+        self.backpointers = [-1] * (ROWS * COLS) # the predecessor of each node, -1 if none
         self.starting_pos = None
         self.goal = None # we have no idea where to go at first
+        self.forward_target = None # the target that forward_steps lead to
+        self.forward_steps = {} # a dictionary from node numbers to their successors on the path to forward_target
+
+    def reset_queue(self):
+        """
+        Empty the queue of cells to visit (front)
+        """
+        self.queue = [] # a FIFO queue of cells to visit
 
     def initialize(self, init_info):
         """
         initialize the agent with sensor and action info
         """
         self.constraints = init_info.actions
+        self.next_action = self.constraints.get_instance() # action vector reused at every step
         return True
 
     def get_next_step(self, r1, c1, r2, c2):
         """
         return the next step when trying to get from current r1,c1 to target r2,c2
         """
-        back2 = [] # cells between origin and r2,c2
-        r, c = r2, c2 # back track from target
-        while (r, c) in self.backpointers:
-            r, c = self.backpointers[(r, c)]
-            if (r1, c1) == (r, c): # if we find starting point, we need to move forward
-                return back2[-1] # return the last step
-            back2.append((r, c))
-        return self.backpointers[(r1, c1)]
+        if self.forward_target != (r2, c2):
+            # back track from the new target once, remembering the step forward from each cell on the way
+            self.forward_steps = {}
+            node = r2 * COLS + c2
+            prev = self.backpointers[node]
+            while prev >= 0:
+                self.forward_steps[prev] = node
+                node = prev
+                prev = self.backpointers[node]
+            self.forward_target = (r2, c2)
+        node = r1 * COLS + c1
+        if node in self.forward_steps: # if we are on the path to the target, we need to move forward
+            return divmod(self.forward_steps[node], COLS)
+        return divmod(self.backpointers[node], COLS)
 
     def enqueue(self, cell):
         self.queue.append(cell)
@@ -410,7 +415,7 @@ class GenericSearchAlgorithm(SearchAgent):
         r2, c2 = self.goal
         dr, dc = r2 - r, c2 - c
         action = get_action_index((dr, dc))
-        v = self.constraints.get_instance() # make the action vector to return
+        v = self.next_action # reuse the action vector we return
         # first, is the node reachable in one action?
         if action is not None and observations[2 + action] == 0:
             v[0] = action # if yes, do that action!
@@ -425,26 +430,35 @@ class GenericSearchAlgorithm(SearchAgent):
         """
         visit the node row, col and decide where we can go from there
         """
-        if (row, col) not in self.visited:
+        here = row * COLS + col
+        if not self.visited[here]:
             self.mark_visited(row, col)
         # we are at row, col, so we mark it visited:
-        self.visited.add((row, col))
-        self.enqueued.add((row, col)) # just in case
+        self.visited[here] = True
+        self.enqueued[here] = True # just in case
         # if we have reached our current subgoal, mark it visited
         if self.goal == (row, col):
-            print  'reached goal: ' + str((row, col))
             self.goal = None
         # then we queue up some places to go next
-        for i, (dr, dc) in enumerate(MAZE_MOVES):
-            if observations[2 + i] == 0: # are we free to perform this action?
+        mark_the_front = self.mark_the_front
+        enqueued = self.enqueued
+        sense = observations.__getitem__
+        for i, dr, dc in MAZE_SENSOR_MOVES:
+            if sense(i) == 0: # are we free to perform this action?
                 # the action index should correspond to sensor index - 2
                 r2 = row + dr # compute the row we could move to
                 c2 = col + dc # compute the col we could move to
-                if (r2, c2) not in self.enqueued:
-                    self.mark_the_front(row, col, r2, c2)
-                    assert self.backpointers.get((row, col)) != (r2, c2)
-                    self.backpointers[(r2, c2)] = row, col # remember where we (would) come from
-                    self.enqueued.add((r2, c2))
+                there = r2 * COLS + c2
+                if not enqueued[there]:
+                    assert self.backpointers[here] != there
+                    self.backpointers[there] = here # remember where we (would) come from
+                    enqueued[there] = True
+                    if r2 == ROWS - 1 and c2 == COLS - 1:
+                        # the exit is right next to us: make it our goal instead of queuing it
+                        self.mark_target(r2, c2)
+                        self.goal = (r2, c2)
+                        return
+                    mark_the_front(row, col, r2, c2)
                     self.enqueue((r2, c2))
 
     def start(self, time, observations):
@@ -453,10 +467,11 @@ class GenericSearchAlgorithm(SearchAgent):
         For the manual A* search, we enqueueue the neighboring nodes and move to one of them.
         """
         # interpret the observations
-        row = observations[0]
-        col = observations[1]
+        row = int(observations[0])
+        col = int(observations[1])
         self.starting_pos = (row, col)
-        get_environment().mark_maze_white(row, col)
+        self.env = get_environment() # the environment we mark the maze in
+        self.env.mark_maze_white(row, col)
         self.starting_pos = (row, col)
         # first, visit the node we are in and queue up some places to go
         self.visit(row, col, observations)
@@ -486,17 +501,17 @@ class GenericSearchAlgorithm(SearchAgent):
         return True
 
     def mark_the_front(self, r, c, r2, c2):
-        get_environment().mark_maze_green(r2, c2)
+        self.env.mark_maze_green(r2, c2)
 
     def mark_target(self, r, c):
-        get_environment().mark_maze_yellow(r, c)
+        self.env.mark_maze_yellow(r, c)
 
     def mark_visited(self, r, c):
         if (r, c) != self.starting_pos:
-            get_environment().mark_maze_blue(r, c)
+            self.env.mark_maze_blue(r, c)
 
     def mark_path(self, r, c):
-        get_environment().mark_maze_white(r, c)
+        self.env.mark_maze_white(r, c)
 
 class BFSSearchAgent(GenericSearchAlgorithm):
     """
@@ -522,56 +537,85 @@ class BFSSearchAgent(GenericSearchAlgorithm):
         """
         if not self.goal: # first, figure out where we are trying to go
             (r2,c2) = self.dequeue()
-            get_environment().unmark_maze_agent(r2,c2)
-            get_environment().mark_maze_yellow(r2,c2)
+            self.env.unmark_maze_agent(r2,c2)
+            self.env.mark_maze_yellow(r2,c2)
             self.goal = (r2, c2)
         # then, check if we can get there
         r2, c2 = self.goal
         dr, dc = r2 - r, c2 - c
         action = get_action_index((dr,dc)) # try to find the action (will return None if it's not there)
-        v = self.constraints.get_instance() # make the action vector to return
+        v = self.next_action # reuse the action vector we return
         # first, is the node reachable in one action?
         if action is not None and observations[2 + action] == 0:
             v[0] = action # if yes, do that action!
         else:
             # if not, we should teleport and return null action
-            get_environment().teleport(self, r2, c2)
+            self.env.teleport(self, r2, c2)
             v[0] = 4
         return v # return the action
 
     def mark_the_front(self, r, c, r2, c2):
-        get_environment().mark_maze_green(r2, c2)
-        get_environment().mark_maze_agent("data/shapes/character/SydneyStatic.xml", r, c, r2, c2)
+        self.env.mark_maze_green(r2, c2)
+        self.env.mark_maze_agent("data/shapes/character/SydneyStatic.xml", r, c, r2, c2)
 
     def mark_visited(self, r, c):
-        get_environment().unmark_maze_agent(r, c)
+        self.env.unmark_maze_agent(r, c)
         if (r, c) != self.starting_pos:
-            get_environment().mark_maze_blue(r, c)
+            self.env.mark_maze_blue(r, c)
 
 class AStarSearchAgent(GenericSearchAlgorithm):
     """
     Egocentric A* algorithm - actually it is just like BFS but the queue is a priority queue
     """
-    def __init__(self):
+    def __init__(self, heuristic=manhattan_heuristic):
         """
         A new Agent
+        @param heuristic function of (r, c) estimating the distance to the goal,
+               e.g. dfs_heuristic to search without one
         """
         # this line is crucial, otherwise the class is not recognized as an AgentBrainPtr by C++
         GenericSearchAlgorithm.__init__(self)
-        # minimize the Manhattan distance
-        self.heuristic = manhattan_heuristic
+        # by default, minimize the Manhattan distance
+        self.heuristic = heuristic
+
+    def reset(self):
+        """
+        Reset the agent
+        """
+        GenericSearchAlgorithm.reset(self)
+        self.distances = [0] * (ROWS * COLS) # distance d from the starting position of each queued cell
+
+    def reset_queue(self):
+        """
+        Empty the priority queue of cells to visit (front)
+        """
+        # the priority queue is a bucket queue: f = d + h is a small integer
+        # bounded by the size of the maze, so cells are kept in one FIFO per f
+        self.buckets = defaultdict(deque)
+        self.min_bucket = 0 # no non-empty bucket has a smaller f than this
+        self.queued = 0 # number of cells in all the buckets
 
     def enqueue(self, cell):
         (r, c) = cell
-        d = self.get_distance(r, c)
+        # the predecessor of a cell is either the starting position or was queued before it,
+        # so d follows from its distance instead of retracing the backpointers to the start
+        node = r * COLS + c
+        d = self.distances[self.backpointers[node]] + 1
+        self.distances[node] = d
         h = self.heuristic(r, c)
-        print "Queuing cell (%s, %s), d = %s, h = %s" % (r, c, d, h)
-        heappush(self.queue, Cell(d + h, r, c))
+        f = d + h
+        self.buckets[f].append((r, c))
+        self.queued += 1
+        if f < self.min_bucket:
+            self.min_bucket = f
 
     def dequeue(self):
-        cell = heappop(self.queue)
-        h, r, c = cell.h, cell.r, cell.c
-        return (r, c)
+        if self.queued == 0:
+            raise IndexError('dequeue from an empty queue')
+        while not self.buckets[self.min_bucket]:
+            self.min_bucket += 1
+        self.queued -= 1
+        return self.buckets[self.min_bucket].popleft()
 
 class FrontAStarSearchAgent(AStarSearchAgent):
     """
@@ -583,20 +627,20 @@ class FrontAStarSearchAgent(AStarSearchAgent):
         """
         if not self.goal: # first, figure out where we are trying to go
             (r2, c2) = self.dequeue()
-            get_environment().unmark_maze_agent(r2, c2)
-            get_environment().mark_maze_yellow(r2, c2)
+            self.env.unmark_maze_agent(r2, c2)
+            self.env.mark_maze_yellow(r2, c2)
             self.goal = (r2, c2)
         # then, check if we can get there
         r2, c2 = self.goal
         dr, dc = r2 - r, c2 - c
         action = get_action_index((dr, dc)) # try to find the action (will return None if it's not there)
-        v = self.constraints.get_instance() # make the action vector to return
+        v = self.next_action # reuse the action vector we return
         # first, is the node reachable in one action?
         if action is not None and observations[2 + action] == 0:
             v[0] = action # if yes, do that action!
         else:
             # if not, we should teleport and return null action
-            get_environment().teleport(self, r2, c2)
+            self.env.teleport(self, r2, c2)
             v[0] = MAZE_NULL_MOVE
         return v # return the action
 
@@ -610,31 +654,31 @@ class CloningAStarSearchAgent(FrontAStarSearchAgent):
         """
         if not self.goal: # first, figure out where we are trying to go
             (r2, c2) = self.dequeue()
-            get_environment().unmark_maze_agent(r2, c2)
-            get_environment().mark_maze_yellow(r2, c2)
+            self.env.unmark_maze_agent(r2, c2)
+            self.env.mark_maze_yellow(r2, c2)
             self.goal = (r2, c2)
         # then, check if we can get there
         r2, c2 = self.goal
         dr, dc = r2 - r, c2 - c
         action = get_action_index((dr, dc)) # try to find the action (will return None if it's not there)
-        v = self.constraints.get_instance() # make the action vector to return
+        v = self.next_action # reuse the action vector we return
         # first, is the node reachable in one action?
         if action is not None and observations[2 + action] == 0:
             v[0] = action # if yes, do that action!
         else:
             # if not, we should teleport and return null action
-            get_environment().teleport(self, r2, c2)
+            self.env.teleport(self, r2, c2)
             v[0] = 4
         return v # return the action
 
     def mark_the_front(self, r, c, r2, c2):
-        get_environment().mark_maze_green(r2, c2)
-        get_environment().mark_maze_agent("data/shapes/character/SydneyStatic.xml", r, c, r2, c2)
+        self.env.mark_maze_green(r2, c2)
+        self.env.mark_maze_agent("data/shapes/character/SydneyStatic.xml", r, c, r2, c2)
 
     def mark_visited(self, r, c):
-        get_environment().unmark_maze_agent(r, c)
+        self.env.unmark_maze_agent(r, c)
         if (r, c) != self.starting_pos:
-            get_environment().mark_maze_blue(r, c)
+            self.env.mark_maze_blue(r, c)
 
 class FirstPersonAgent(AgentBrain):
     """
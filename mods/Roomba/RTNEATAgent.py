@@ -19,6 +19,11 @@ class RTNEATAgent(AgentBrain):
         """
         self.actions = init_info.actions # constraints for actions
         self.sensors = init_info.sensors # constraints for sensors
+        # network inputs (the sensors followed by the bias value), refilled at every step
+        self.inputs = [0.0] * (len(self.sensors) + 1)
+        self.inputs[-1] = 0.3
+        # network outputs as an action vector, refilled at every step
+        self.outputs = self.actions.get_instance()
         return True
 
     def start(self, time, sensors):
@@ -60,10 +65,9 @@ class RTNEATAgent(AgentBrain):
         assert(len(sensors)==6)
         # convert the sensors into the [0.0, 1.0] range
         sensors = self.sensors.normalize(sensors)
-        # create the list of sensors
-        inputs = [sensor for sensor in sensors]        
-        # add the bias value
-        inputs.append(0.3)
+        # copy the sensors into the list of inputs (the bias value stays last)
+        inputs = self.inputs
+        inputs[:-1] = sensors
 
         # get the rtNEAT organism we are assigned
         org = get_ai("rtneat").get_organism(self)
@@ -76,10 +80,9 @@ class RTNEATAgent(AgentBrain):
         net.activate()
         # get the list of network outputs
         outputs = net.get_outputs()
-        # create a C++ vector for action values
-        actions = self.actions.get_instance()
-        # assign network outputs to action vector
-        for i in range(0,len(self.actions.get_instance())):
+        # assign network outputs to the preallocated action vector
+        actions = self.outputs
+        for i in xrange(len(actions)):
             actions[i] = outputs[i]
         # convert the action vector back from [0.0, 1.0] range
         actions = self.actions.denormalize(actions)